@@ -1,24 +1,48 @@
 from __future__ import annotations
 import datetime as _dt
+import functools
+import hashlib
 import os
-from typing import List, Dict
-import time
+from operator import itemgetter
+from typing import AsyncIterator, List, Dict
+import asyncio
 import logging
+import random
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager, closing, suppress
 from pathlib import Path
 
 
-from tinkoff.invest import Client, CandleInterval, InstrumentIdType
+from tinkoff.invest import AsyncClient, Client, CandleInterval, HistoricCandle
+from tinkoff.invest.async_services import AsyncServices
 from tinkoff.invest.schemas import AssetsRequest
 from tinkoff.invest.utils import now
 
+import orjson
 from dotenv import load_dotenv
 from tinkoff.invest.exceptions import RequestError
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 
 
-__all__ = ["scan_gap_up"]
+__all__ = ["iter_gap_up", "scan_gap_up", "scan_gap_up_sync"]
+
+# Max number of GetCandles requests in flight at once (Tinkoff per-IP concurrency)
+MAX_CONCURRENT_REQUESTS = 30
+
+# Retry policy for RESOURCE_EXHAUSTED responses
+_RETRY_ATTEMPTS = 5
+_RETRY_MAX_DELAY = 60.0
+
+# GetAssets asset type that carries share instruments
+_SHARE_ASSET_TYPE = "ASSET_TYPE_SECURITY"
+
+# Quotation.nano is expressed in billionths of a unit
+_NANO = 1_000_000_000
 
 # ---------------------------------------------------------------------------
 # Load environment variables from .env
@@ -51,7 +75,38 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------
 # FastAPI application
 # ---------------------------------------------------------------------------
-app = FastAPI(title="Gap Scanner API")
+# Long-lived gRPC client shared by all requests (set for the app's lifetime)
+_client: AsyncServices | None = None
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    """Open one AsyncClient channel and start the background refresh worker."""
+    global _client
+    _prune_cache()
+    token = os.getenv("TINKOFF_INVEST_TOKEN")
+    if not token:
+        yield  # scan_gap_up reports the missing token per request
+        return
+    async with AsyncClient(token) as client:
+        _client = client
+        refresher = asyncio.create_task(_refresh_loop()) if _REFRESH_INTERVAL > 0 else None
+        try:
+            yield
+        finally:
+            if refresher is not None:
+                refresher.cancel()
+                # wait for it to stop before the client closes under a refresh in progress
+                with suppress(asyncio.CancelledError):
+                    await refresher
+            _client = None
+
+
+app = FastAPI(
+    title="Gap Scanner API",
+    default_response_class=ORJSONResponse,
+    lifespan=_lifespan,
+)
 
 # Allow requests from any origin (adjust in production!)
 app.add_middleware(
@@ -77,24 +132,141 @@ def _to_ts(date_: _dt.date) -> _dt.datetime:
     return _dt.datetime.combine(date_, _dt.time.min, tzinfo=_dt.timezone.utc)
 
 
+@functools.lru_cache(maxsize=8)
+def _scan_bounds(date: _dt.date) -> tuple[_dt.date, _dt.datetime, _dt.datetime, _dt.datetime]:
+    """Return ``(prev_day, prev_from, today_from, today_to)`` for a scan of *date*."""
+    prev_day = _prev_trading_day(date)
+    return prev_day, _to_ts(prev_day), _to_ts(date), _to_ts(date + _dt.timedelta(days=1))
+
+
+# ---------------------------------------------------------------------------
+# Prev-day close cache (historical daily candles never change)
+# ---------------------------------------------------------------------------
+_CACHE_PATH = Path.home() / ".cache" / "gap_scanner" / "candles.db"
+_CACHE_TTL_DAYS = 30
+
+
+def _open_cache() -> sqlite3.Connection:
+    """Open the on-disk cache, creating it if needed (the caller closes it)."""
+    _CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(_CACHE_PATH)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS prev_close ("
+        "uid TEXT NOT NULL, day TEXT NOT NULL, units INTEGER NOT NULL, nano INTEGER NOT NULL, "
+        "PRIMARY KEY (uid, day))"
+    )
+    return conn
+
+
+def _prune_cache() -> None:
+    """Drop cached closes older than the TTL (run once at startup)."""
+    expire_before = _dt.date.today() - _dt.timedelta(days=_CACHE_TTL_DAYS)
+    # closing() closes the connection; the inner ``with conn`` only commits
+    with closing(_open_cache()) as conn, conn:
+        conn.execute("DELETE FROM prev_close WHERE day < ?", (expire_before.isoformat(),))
+
+
+def _load_prev_closes(day: _dt.date) -> Dict[str, tuple[int, int]]:
+    """Return cached ``{uid: (units, nano)}`` closes for *day*."""
+    with closing(_open_cache()) as conn:
+        rows = conn.execute(
+            "SELECT uid, units, nano FROM prev_close WHERE day = ?", (day.isoformat(),)
+        ).fetchall()
+    return {uid: (units, nano) for uid, units, nano in rows}
+
+
+def _store_prev_closes(day: _dt.date, closes: list[tuple[str, int, int]]) -> None:
+    """Persist ``(uid, units, nano)`` closes for *day*."""
+    if not closes:
+        return
+    with closing(_open_cache()) as conn, conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO prev_close (uid, day, units, nano) VALUES (?, ?, ?, ?)",
+            [(uid, day.isoformat(), units, nano) for uid, units, nano in closes],
+        )
+
+
 # ---------------------------------------------------------------------------
 # Core scanner
 # ---------------------------------------------------------------------------
 
-def scan_gap_up(*, min_gap: float = 0.10, date: _dt.date | None = None) -> List[Dict]:
-    """Scan all shares via GetAssets and return those with an **opening gap ≥ min_gap**.
+@functools.lru_cache(maxsize=8)
+def _get_share_instruments(token: str, cache_date: _dt.date) -> list[tuple[str, str, str]]:
+    """Return ``(uid, figi, ticker)`` of every share listed via GetAssets.
 
-    Parameters
-    ----------
-    min_gap: float, default 0.10
-        Minimal gap expressed as fraction (0.10 == 10 %).
-    date: datetime.date | None
-        Market date to check. Defaults to **today** in UTC.
+    Memoized per *cache_date*; only the trimmed tuples are kept, not the
+    full GetAssets response.
+    """
+    with Client(token) as client:
+        assets_resp = client.instruments.get_assets(AssetsRequest())
 
-    Returns
-    -------
-    List[dict]
-        Each dict contains keys: ticker, figi, uid, prev_close, open, gap.
+    # keep only share instruments of security‑type assets; every Asset can contain
+    # multiple instruments (different exchanges, classes, etc.)
+    shares = [
+        (instr.uid, instr.figi, instr.ticker)
+        for asset in assets_resp.assets
+        if getattr(asset.type, "name", "") == _SHARE_ASSET_TYPE
+        for instr in (asset.instruments or ())
+        if instr.instrument_type == "share"
+    ]
+    logger.info(f"Loaded {len(shares)} shares for {cache_date}")
+    return shares
+
+
+def _rate_limit_delay(e: RequestError, attempt: int) -> float:
+    """Seconds to wait before retrying after RESOURCE_EXHAUSTED.
+
+    Prefers the ``ratelimit_reset`` trailer sent by Tinkoff; falls back to
+    exponential backoff (1, 2, 4 … capped at ``_RETRY_MAX_DELAY``). A little
+    jitter keeps concurrent requests from retrying in lock‑step.
+    """
+    reset = getattr(getattr(e, "metadata", None), "ratelimit_reset", None)
+    delay = float(reset) if reset else float(2 ** attempt)
+    return min(delay, _RETRY_MAX_DELAY) + random.uniform(0, 1)
+
+
+async def _fetch_daily_candles(
+    client: AsyncServices,
+    sem: asyncio.Semaphore,
+    uid: str,
+    ticker: str,
+    from_ts: _dt.datetime,
+    to_ts: _dt.datetime,
+) -> list[HistoricCandle]:
+    """Fetch daily candles for one instrument, holding *sem* for the duration of the RPC.
+
+    Returns an empty list when the request fails so that one bad instrument
+    does not abort the whole scan.
+    """
+    for attempt in range(_RETRY_ATTEMPTS):
+        async with sem:
+            try:
+                return (
+                    await client.market_data.get_candles(
+                        instrument_id=uid,
+                        from_=from_ts,
+                        to=to_ts,
+                        interval=CandleInterval.CANDLE_INTERVAL_DAY,
+                    )
+                ).candles
+            except RequestError as e:
+                if "RESOURCE_EXHAUSTED" not in str(e):
+                    logger.error(f"{ticker}: {e}")
+                    return []
+                delay = _rate_limit_delay(e, attempt)
+        # sleep outside the semaphore so other requests keep going
+        logger.warning(f"rate‑limit hit ({ticker}); retrying in {delay:.1f} s")
+        await asyncio.sleep(delay)
+    logger.error(f"retry failed for {ticker}; skipping")
+    return []
+
+
+async def iter_gap_up(*, min_gap: float = 0.10, date: _dt.date | None = None) -> AsyncIterator[Dict]:
+    """Yield shares with an **opening gap ≥ min_gap** as soon as their candles arrive.
+
+    Rows come out in completion order, not sorted. If no share passes the
+    threshold, the max‑gap share is yielded last for back‑testing, with
+    ``gap_test`` set (decided by the same exact integer comparison as the filter).
     """
     token = os.getenv("TINKOFF_INVEST_TOKEN")
     if not token:
@@ -102,137 +274,139 @@ def scan_gap_up(*, min_gap: float = 0.10, date: _dt.date | None = None) -> List[
 
     if date is None:
         date = now().date()
-    prev_day = _prev_trading_day(date)
-
-    result: List[Dict] = []
-    max_gap: float = float("-inf")
-    max_stock: Dict | None = None
-
-    with Client(token) as client:
-        assets_resp = client.instruments.get_assets(AssetsRequest())
-
-        total = len(assets_resp.assets)
-        for i, asset in enumerate(assets_resp.assets):
-            # keep only security‑type assets
-            if getattr(asset.type, "name", str(asset.type)) != "ASSET_TYPE_SECURITY":
-                continue
-            if not getattr(asset, "instruments", None):
-                continue  # nothing to inspect
-
-            # every Asset can contain multiple instruments (different exchanges, classes, etc.)
-            for instr in asset.instruments:
-                if instr.instrument_type != "share":
-                    continue  # we only care about shares
-
-                uid = instr.uid
-                figi = instr.figi
-                ticker = instr.ticker
-
-                # --- previous close candle (daily) ---
-                prev_from = _to_ts(prev_day)
-                prev_to = _to_ts(prev_day + _dt.timedelta(days=1))
-                try:
-                    prev_candles = client.market_data.get_candles(
-                        instrument_id=uid,
-                        from_=prev_from,
-                        to=prev_to,
-                        interval=CandleInterval.CANDLE_INTERVAL_DAY,
-                    ).candles
-                except RequestError as e:
-                    if "RESOURCE_EXHAUSTED" in str(e):
-                        logger.warning("rate‑limit hit (prev candles); sleeping 60 s then retrying once")
-                        time.sleep(60)
-                        try:
-                            prev_candles = client.market_data.get_candles(
-                                instrument_id=uid,
-                                from_=prev_from,
-                                to=prev_to,
-                                interval=CandleInterval.CANDLE_INTERVAL_DAY,
-                            ).candles
-                        except RequestError:
-                            logger.error(f"retry failed for {ticker}; skipping")
-                            continue
-                    else:
-                        logger.error(f"{ticker}: {e}")
-                        continue
-                if not prev_candles:
-                    continue
-
-                # --- today open candle (daily) ---
-                today_from = _to_ts(date)
-                today_to = _to_ts(date + _dt.timedelta(days=1))
-                try:
-                    today_candles = client.market_data.get_candles(
-                        instrument_id=uid,
-                        from_=today_from,
-                        to=today_to,
-                        interval=CandleInterval.CANDLE_INTERVAL_DAY,
-                    ).candles
-                except RequestError as e:
-                    if "RESOURCE_EXHAUSTED" in str(e):
-                        logger.warning("rate‑limit hit (today candles); sleeping 60 s then retrying once")
-                        time.sleep(60)
-                        try:
-                            today_candles = client.market_data.get_candles(
-                                instrument_id=uid,
-                                from_=today_from,
-                                to=today_to,
-                                interval=CandleInterval.CANDLE_INTERVAL_DAY,
-                            ).candles
-                        except RequestError:
-                            logger.error(f"retry failed for {ticker}; skipping")
-                            continue
-                    else:
-                        logger.error(f"{ticker}: {e}")
+    prev_day, prev_from_ts, today_from_ts, to_ts = _scan_bounds(date)
+
+    found = False
+    # (open, prev_close, share index) as scaled integers for every scanned
+    # share – only used to pick the back‑test fallback when nothing passes
+    all_gaps: list[tuple[int, int, int]] = []
+    new_closes: list[tuple[str, int, int]] = []
+    cached_closes = _load_prev_closes(prev_day)
+    # the share universe changes at most once a day – reuse it between scans
+    shares = await asyncio.to_thread(_get_share_instruments, token, now().date())
+    threshold_num = round((1 + min_gap) * _NANO)
+    total = len(shares)
+    log_rows = logger.isEnabledFor(logging.INFO)
+
+    async def _fetch(i: int, uid: str, ticker: str) -> tuple[int, list[HistoricCandle]]:
+        from_ts = today_from_ts if uid in cached_closes else prev_from_ts
+        return i, await _fetch_daily_candles(client, sem, uid, ticker, from_ts, to_ts)
+
+    async with AsyncExitStack() as stack:
+        # reuse the app-wide channel; open a private one outside the API (scan_gap_up_sync)
+        client = _client or await stack.enter_async_context(AsyncClient(token))
+        # --- previous close + today open in one daily-candle request per share ---
+        # (only today's candle when the previous close is already cached).
+        # MarketDataStream candle subscriptions only push live updates for the
+        # current session, so they cannot serve a past *date* or the previous
+        # close; unary GetCandles under the semaphore is kept for that reason.
+        sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        tasks = [
+            asyncio.create_task(_fetch(i, uid, ticker))
+            for i, (uid, _figi, ticker) in enumerate(shares)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                i, candles = await next_done
+                uid, figi, ticker = shares[i]
+                if not candles or candles[-1].time.date() != date:
+                    continue  # no candle for the scan date
+
+                cached = cached_closes.get(uid)
+                if cached is None:
+                    # need both the previous-day and the today candle
+                    if len(candles) < 2 or candles[0].time.date() != prev_day:
                         continue
-                if not today_candles:
-                    continue
-
-                prev_close = prev_candles[-1].close
-                prev_close_price = prev_close.units + prev_close.nano / 1e9
-
-                today_open = today_candles[0].open  # first candle of the day
-                today_open_price = today_open.units + today_open.nano / 1e9
-
+                    prev_close = candles[0].close
+                    cached = (prev_close.units, prev_close.nano)
+                    new_closes.append((uid, *cached))
+
+                # prices as integers scaled by 1e9 (exact Quotation values)
+                prev_scaled = cached[0] * _NANO + cached[1]
+                if prev_scaled <= 0:
+                    continue  # no meaningful close to compute a gap from
+                today_open = candles[-1].open  # daily candle of the scan date
+                today_scaled = today_open.units * _NANO + today_open.nano
+                all_gaps.append((today_scaled, prev_scaled, i))
+                # open / prev_close >= 1 + min_gap, without float division
+                passes = today_scaled * _NANO >= prev_scaled * threshold_num
+                if not (passes or log_rows):
+                    continue  # floats are only needed for emitted or logged rows
+
+                prev_close_price = prev_scaled / _NANO
+                today_open_price = today_scaled / _NANO
                 gap = (today_open_price - prev_close_price) / prev_close_price
-                logger.info(f'{i}/{total}"ticker": {ticker}'
-                             f' "figi": {figi}'
-                             f' "uid": {uid}'
-                             f' "prev_close": {prev_close_price}'
-                             f' "open": {today_open_price}'
-                             f' "gap": {gap}')
-                # track absolute maximum gap stock
-                if gap > max_gap:
-                    max_gap = gap
-                    max_stock = {
+                if log_rows:
+                    logger.info(
+                        '%d/%d "ticker": %s "figi": %s "uid": %s "prev_close": %s "open": %s "gap": %s',
+                        i, total, ticker, figi, uid, prev_close_price, today_open_price, gap,
+                    )
+                if passes:
+                    found = True
+                    yield {
                         "ticker": ticker,
                         "figi": figi,
                         "uid": uid,
                         "prev_close": prev_close_price,
                         "open": today_open_price,
                         "gap": gap,
+                        "gap_test": False,
                     }
-                if gap >= min_gap:
-                    result.append(
-                        {
-                            "ticker": ticker,
-                            "figi": figi,
-                            "uid": uid,
-                            "prev_close": prev_close_price,
-                            "open": today_open_price,
-                            "gap": gap,
-                        }
-                    )
+        finally:
+            # the consumer may stop early (e.g. a streaming client went away)
+            for task in tasks:
+                task.cancel()
+            _store_prev_closes(prev_day, new_closes)
 
     # If no stocks met the gap threshold, include the max‑gap stock for testing
-    if not result and max_stock is not None:
+    if not found and all_gaps:
+        today_scaled, prev_scaled, idx = max(all_gaps, key=lambda g: g[0] / g[1])
+        uid, figi, ticker = shares[idx]
+        prev_close_price = prev_scaled / _NANO
+        today_open_price = today_scaled / _NANO
+        max_gap = (today_open_price - prev_close_price) / prev_close_price
         logger.info(
             f"No gaps ≥{min_gap*100:.2f}% found; adding max‑gap "
-            f"{max_stock['ticker']} ({max_gap*100:.2f}%) for back‑test"
+            f"{ticker} ({max_gap*100:.2f}%) for back‑test"
         )
-        result.append(max_stock)
+        yield {
+            "ticker": ticker,
+            "figi": figi,
+            "uid": uid,
+            "prev_close": prev_close_price,
+            "open": today_open_price,
+            "gap": max_gap,
+            "gap_test": True,  # no share passed the threshold above
+        }
+
+
+async def scan_gap_up(*, min_gap: float = 0.10, date: _dt.date | None = None) -> List[Dict]:
+    """Scan all shares via GetAssets and return those with an **opening gap ≥ min_gap**.
+
+    Daily candles are requested concurrently, at most ``MAX_CONCURRENT_REQUESTS``
+    at a time.
+
+    Parameters
+    ----------
+    min_gap: float, default 0.10
+        Minimal gap expressed as fraction (0.10 == 10 %).
+    date: datetime.date | None
+        Market date to check. Defaults to **today** in UTC.
+
+    Returns
+    -------
+    List[dict]
+        Each dict contains keys: ticker, figi, uid, prev_close, open, gap, gap_test.
+    """
+    result = [row async for row in iter_gap_up(min_gap=min_gap, date=date)]
     # Sort by gap desc
-    return sorted(result, key=lambda x: x["gap"], reverse=True)
+    result.sort(key=itemgetter("gap"), reverse=True)
+    return result
+
+
+def scan_gap_up_sync(*, min_gap: float = 0.10, date: _dt.date | None = None) -> List[Dict]:
+    """Blocking wrapper around :func:`scan_gap_up` for callers without an event loop."""
+    return asyncio.run(scan_gap_up(min_gap=min_gap, date=date))
 
 
 
@@ -240,12 +414,111 @@ def scan_gap_up(*, min_gap: float = 0.10, date: _dt.date | None = None) -> List[
 # API endpoints
 # ---------------------------------------------------------------------------
 
+# Scans currently running, keyed by (min_gap, date); concurrent identical
+# requests await the same task instead of starting a new full scan.
+_inflight: Dict[tuple[float, _dt.date], asyncio.Task] = {}
+
+# Last finished scan per (min_gap, date) as (time.monotonic(), UTC start time,
+# results), least recently used first and capped at _RESULTS_CACHE_MAX keys, and
+# when each key was last requested. Keys requested within _HOT_KEY_IDLE seconds
+# are re-scanned in the background every GAP_REFRESH_INTERVAL seconds.
+_results_cache: OrderedDict[tuple[float, _dt.date], tuple[float, _dt.datetime, List[Dict]]] = OrderedDict()
+_last_requested: Dict[tuple[float, _dt.date], float] = {}
+_RESULTS_CACHE_MAX = 64
+_RESULT_TTL = 120.0
+_HOT_KEY_IDLE = 600.0
+_REFRESH_INTERVAL = float(os.getenv("GAP_REFRESH_INTERVAL", "30"))
+
+
+def _scan_key(min_gap: float, date: _dt.date | None) -> tuple[float, _dt.date]:
+    return round(min_gap, 4), date or now().date()
+
+
+def _is_final(date: _dt.date, started: _dt.datetime) -> bool:
+    """A scan of *date* is final only if it started after that (UTC) day had ended."""
+    return started.date() > date
+
+
+async def _timed_scan(min_gap: float, date: _dt.date) -> tuple[_dt.datetime, List[Dict]]:
+    """Run :func:`scan_gap_up` and return its results with the time the scan started."""
+    started = now()
+    return started, await scan_gap_up(min_gap=min_gap, date=date)
+
+
+async def _scan_coalesced(min_gap: float, date: _dt.date | None) -> tuple[List[Dict], bool]:
+    """Run :func:`scan_gap_up`, sharing one in-flight scan between identical requests.
+
+    Returns the results and whether they are final (see :func:`_is_final`).
+    """
+    key = _scan_key(min_gap, date)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_timed_scan(*key))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t: _inflight.pop(key, None))
+    # shield: one client disconnecting must not cancel the scan for the others
+    started, results = await asyncio.shield(task)
+    _results_cache[key] = (time.monotonic(), started, results)
+    _results_cache.move_to_end(key)
+    while len(_results_cache) > _RESULTS_CACHE_MAX:
+        _results_cache.popitem(last=False)
+    return results, _is_final(key[1], started)
+
+
+async def _cached_scan(min_gap: float, date: _dt.date | None) -> tuple[List[Dict], bool]:
+    """Return the cached scan for (min_gap, date) if still fresh, else scan now.
+
+    Returns the results and whether they are final (see :func:`_is_final`).
+    """
+    key = _scan_key(min_gap, date)
+    _last_requested[key] = time.monotonic()
+    cached = _results_cache.get(key)
+    if cached is not None:
+        scanned_at, started, results = cached
+        # a scan started after its day had ended never changes; others expire after _RESULT_TTL
+        final = _is_final(key[1], started)
+        if final or time.monotonic() - scanned_at < _RESULT_TTL:
+            _results_cache.move_to_end(key)
+            return results, final
+    return await _scan_coalesced(*key)
+
+
+async def _refresh_loop() -> None:
+    """Keep today's recently requested scans warm so requests hit the cache."""
+    while True:
+        await asyncio.sleep(_REFRESH_INTERVAL)
+        today = now().date()
+        idle_before = time.monotonic() - _HOT_KEY_IDLE
+        for key, requested_at in list(_last_requested.items()):
+            if key[1] != today or requested_at < idle_before:
+                # nobody is polling it (or it is a past date) – stop refreshing
+                _last_requested.pop(key, None)
+                continue
+            try:
+                await _scan_coalesced(*key)
+            except Exception:
+                logger.exception("background refresh failed for %s", key)
+
+
+def _results_etag(results: List[Dict]) -> str:
+    """Strong ETag over the (uid, gap) pairs of a scan result."""
+    digest = hashlib.blake2b(
+        orjson.dumps([(r["uid"], r["gap"]) for r in results]), digest_size=8
+    ).hexdigest()
+    return f'"{digest}"'
+
+
 @app.get("/gap-up")
-def read_gap_up(
+async def read_gap_up(
+    request: Request,
+    response: Response,
     min_gap: float = Query(0.10, description="Minimal gap fraction (0.10 == 10 %)", ge=0.0),
     date: str | None = Query(None, description="Date in YYYY-MM-DD; default today (UTC)"),
 ):
-    """Return shares whose **opening gap** ≥ *min_gap* on the given *date*."""
+    """Return shares whose **opening gap** ≥ *min_gap* on the given *date*.
+
+    Responses carry an ``ETag``; a matching ``If-None-Match`` gets ``304``.
+    """
     if date:
         try:
             date_parsed = _dt.datetime.strptime(date, "%Y-%m-%d").date()
@@ -254,8 +527,36 @@ def read_gap_up(
     else:
         date_parsed = None
 
-    results = scan_gap_up(min_gap=min_gap, date=date_parsed)
-    # Mark whether this record was returned only for back‑test purposes (no gap met the threshold)
-    for r in results:
-        r["gap_test"] = r["gap"] < min_gap
+    results, final = await _cached_scan(min_gap, date_parsed)
+
+    etag = _results_etag(results)
+    headers = {"ETag": etag}
+    if final:
+        # scanned after the session had ended: the result never changes
+        headers["Cache-Control"] = "public, max-age=86400"
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     return {"count": len(results), "results": results}
+
+
+@app.get("/gap-up/stream")
+async def stream_gap_up(
+    min_gap: float = Query(0.10, description="Minimal gap fraction (0.10 == 10 %)", ge=0.0),
+    date: str | None = Query(None, description="Date in YYYY-MM-DD; default today (UTC)"),
+):
+    """Stream matching shares as NDJSON while the scan is running (unsorted)."""
+    if date:
+        try:
+            date_parsed = _dt.datetime.strptime(date, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format, expected YYYY-MM-DD")
+    else:
+        date_parsed = None
+
+    async def _ndjson() -> AsyncIterator[bytes]:
+        async for r in iter_gap_up(min_gap=min_gap, date=date_parsed):
+            yield orjson.dumps(r, option=orjson.OPT_APPEND_NEWLINE)
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
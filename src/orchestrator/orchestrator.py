@@ -1,15 +1,14 @@
 import os
-import csv
+import asyncio
+import contextlib
 import logging
-import requests
+import httpx
+import orjson
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from zoneinfo import ZoneInfo
-from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.triggers.cron import CronTrigger
 from dotenv import load_dotenv
-import tempfile
-import shutil
 
 # ---------------------------------------------------------------------------
 # Load environment variables from .env
@@ -24,12 +23,80 @@ else:
 # Upstream service URLs (override via docker-compose environment variables)
 # ---------------------------------------------------------------------------
 SCAN_URL = os.getenv("GAP_SCANNER_URL", "http://gap_scanner:8000/gap-up")
+SCAN_STREAM_URL = SCAN_URL.rstrip("/") + "/stream"  # NDJSON variant of the same scan
 VWAP_URL = os.getenv("VWAP_LEVELS_URL", "http://vwap_levels:8001/vwap")
 GAP_AND_GO_URL = os.getenv("GAP_AND_GO_URL", "http://gap_and_go:8002/gap-and-go")
 FLAT_BREAKOUT_URL = os.getenv("FLAT_BREAKOUT_URL", "http://flat_breakout:8003/flat-breakout")
-BULL_FLAG_URL = os.getenv("BULL_FLAG_URL", "http://bull_flag:8004/bull-flag")
-FIRST_PULLBACK_URL = os.getenv("FIRST_PULLBACK_URL", "http://first_pullback:8005/first-pullback")
-ABCD_URL = os.getenv("ABCD_URL", "http://abcd:8006/abcd")
+BULL_FLAG_URL = os.getenv("BULL_FLAG_URL", "http://patterns:8004/bull-flag")
+FIRST_PULLBACK_URL = os.getenv("FIRST_PULLBACK_URL", "http://patterns:8004/first-pullback")
+ABCD_URL = os.getenv("ABCD_URL", "http://patterns:8004/abcd")
+
+# Report labels per service: (report label, key in the response | None for the whole body)
+VWAP_LABELS = (("VWAP Levels", None),)
+GAP_AND_GO_LABELS = (("Gap&Go", None),)
+FLAT_LABELS = (
+    ("1m Flat-Top", "flat_top_1min"),
+    ("1m Flat-Bottom", "flat_bottom_1min"),
+    ("5m Flat-Top", "flat_top_5min"),
+    ("5m Flat-Bottom", "flat_bottom_5min"),
+)
+BULL_FLAG_LABELS = (("1m BullFlag", "bull_flag_1min"), ("5m BullFlag", "bull_flag_5min"))
+FIRST_PULLBACK_LABELS = (
+    ("1m FirstPullback", "first_pullback_1min"),
+    ("5m FirstPullback", "first_pullback_5min"),
+)
+ABCD_LABELS = (("1m ABCD", "abcd_1min"), ("5m ABCD", "abcd_5min"))
+
+# ---------------------------------------------------------------------------
+# HTTP client limits: keep-alive connections reused across all upstream calls
+# ---------------------------------------------------------------------------
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+HTTP_TIMEOUT = 60.0  # per analytical service request
+HTTP_RETRIES = 2  # extra attempts after a dropped connection
+HTTP_RETRY_BACKOFF = 0.2  # seconds, grows linearly per attempt
+SCAN_TIMEOUT = 1200.0  # full-market gap scan
+MAX_CONCURRENT_TICKERS = 8  # tickers whose services are queried at the same time
+
+# Report directory and same-day cache of the gap scanner's result
+REPORTS_DIR = Path(__file__).resolve().parent / "reports"
+GAPS_CACHE_DIR = REPORTS_DIR / ".cache"
+
+# Report timezone (Moscow has no DST: always UTC+3)
+MSK = ZoneInfo("Europe/Moscow")
+
+# Daily run time, MSK
+RUN_HOUR, RUN_MINUTE = 10, 0
+
+# Line terminator of reports/strategy_results.csv (csv.writer default)
+CSV_LINE_END = "\r\n"
+
+# Report row templates: head = date,ticker,gap,prev_close,open; tail = vwap,support,resistance
+# (entry/stop are pre-formatted strings: a service may return them as null)
+ROW_TRIGGERED = "{head},{strat},✅,{entry},{stop},{target:.2f},+{pl:.2f},{time},{tail}"
+ROW_TRIGGERED_NO_TARGET = "{head},{strat},✅,{entry},{stop},,,{time},{tail}"
+ROW_NOT_TRIGGERED = "{head},{strat},❌,,,,,,{tail}"
+
+# Strategy result fields used by the report, in unpacking order
+RESULT_FIELDS = ("triggered", "entry_price", "stop_price", "target_price", "trigger_time")
+
+# Report columns, joined once
+CSV_HEADER = ",".join((
+    "date",
+    "ticker",
+    "gap",
+    "prev_close",
+    "open",
+    "strategy",
+    "status",
+    "entry",
+    "stop",
+    "target",
+    "pl",
+    "time",
+    "vwap",
+    "support",
+    "resistance",
+))
 
 # ---------------------------------------------------------------------------
 # Logging
@@ -44,340 +111,346 @@ logging.basicConfig(
 # ---------------------------------------------------------------------------
 # Main orchestration logic
 # ---------------------------------------------------------------------------
-def run() -> None:
-    """Fetch gap list and run all strategies for each gapping ticker."""
+@lru_cache(maxsize=4096)
+def _msk_hhmm(ts: str) -> str:
+    """Format an ISO timestamp as Moscow ``HH:MM`` ("" if it cannot be parsed).
+
+    UTC strings (``...Z`` / ``...+00:00``, as the strategy services return them)
+    are shifted by the fixed +3 h offset without building datetime objects.
+    Memoised: many rows share the same trigger minute.
+    """
+    try:
+        if ts.endswith(("Z", "+00:00")) and ts[10] == "T":
+            hour = (int(ts[11:13]) + 3) % 24
+            return f"{hour:02d}:{ts[14:16]}"
+        return datetime.fromisoformat(ts).astimezone(MSK).strftime("%H:%M")
+    except (ValueError, IndexError):
+        return ""
+
+
+def _read_last_line(path: Path, chunk_size: int = 4096) -> bytes:
+    """Return the last non-empty line of *path*, reading backwards from the end."""
+    with path.open("rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        tail = b""
+        while pos > 0:
+            step = min(chunk_size, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+            stripped = tail.rstrip(b"\r\n")
+            if b"\n" in stripped:
+                return stripped.rsplit(b"\n", 1)[1]
+        return tail.rstrip(b"\r\n")
+
+
+def _gaps_cache_path(today: str) -> Path:
+    return GAPS_CACHE_DIR / f"gaps_{today}.json"
+
+
+def _load_cached_gaps(today: str) -> list[dict] | None:
+    """Return the gap list saved for *today* if it was scanned after the session open.
+
+    A list scanned before RUN_HOUR:RUN_MINUTE MSK (e.g. by the immediate run after
+    a restart) does not have the day's open prices yet and is ignored.
+    """
+    path = _gaps_cache_path(today)
+    session_open = datetime.combine(
+        date.fromisoformat(today), datetime.min.time().replace(hour=RUN_HOUR, minute=RUN_MINUTE), MSK
+    )
+    try:
+        if path.stat().st_mtime < session_open.timestamp():
+            return None
+        return orjson.loads(path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
 
-    today: str = date.today().isoformat()  # YYYY-MM-DD
-    params_gap = {"min_gap": 0.10, "date": today}
 
-    # ------------------------------
-    # Gap-scanner
-    # ------------------------------
-    try:
-        resp = requests.get(SCAN_URL, params=params_gap, timeout=1200)
-        resp.raise_for_status()
-        gaps = resp.json()
-    except Exception as exc:  # broad except so orchestrator continues even if scanner fails
-        logging.error("Gap-scanner: %s", exc)
+def _store_cached_gaps(today: str, gaps: list[dict]) -> None:
+    """Save today's gap list; older days' files are removed. An empty list is not saved."""
+    if not gaps:
         return
+    try:
+        GAPS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        for old in GAPS_CACHE_DIR.glob("gaps_*.json"):
+            old.unlink(missing_ok=True)
+        _gaps_cache_path(today).write_bytes(orjson.dumps(gaps))
+    except OSError as exc:
+        logging.warning("Не удалось сохранить кэш гэпов: %s", exc)
 
-    if not gaps or not gaps.get("results"):
-        logging.info(f"Нет акций с гэпом выше порога. gaps: {gaps}")
-        return
 
-    results_rows: list = []  # collect results for report
+async def _fetch_json(client: httpx.AsyncClient, url: str, params: dict) -> dict:
+    """GET *url* and decode its JSON body, retrying dropped connections with a short backoff.
 
-    # -------------------------------------------------------------------
-    # Iterate over each gapping ticker and query all analytical services
-    # -------------------------------------------------------------------
-    for gap in gaps["results"]:
-        ticker: str = gap["ticker"]
-        uid: str = gap["uid"]
-        gap_pct: float = gap["gap"] * 100
-        logging.info("Лидер по гэпу: %s  gap=%.2f%%", ticker, gap_pct)
+    Timeouts and HTTP error statuses are not retried: the services answer 5xx
+    deterministically (e.g. no candles for the day), so a retry would only repeat it.
+    """
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            resp = await client.get(url, params=params)
+            break
+        except (httpx.NetworkError, httpx.RemoteProtocolError):
+            if attempt == HTTP_RETRIES:
+                raise
+            await asyncio.sleep(HTTP_RETRY_BACKOFF * (attempt + 1))
+    resp.raise_for_status()
+    return orjson.loads(resp.content)
+
+
+def _log_vwap(ticker: str, label: str, res: dict) -> None:
+    """Log the VWAP / support / resistance levels."""
+    logging.info(
+        "%s VWAP=%.2f  S=%.2f  R=%.2f",
+        ticker,
+        res.get("vwap", float("nan")),
+        res.get("support", float("nan")),
+        res.get("resistance", float("nan")),
+    )
+
+
+def _log_gap_and_go(ticker: str, label: str, res: dict) -> None:
+    """Log a Gap&Go result (with the first candle range when not triggered)."""
+    if res.get("triggered"):
+        _log_pattern(ticker, label, res)
+    else:
+        logging.info(
+            "%s %s not triggered. First candle H/L: %.2f / %.2f",
+            ticker,
+            label,
+            res["first_candle_high"],
+            res["first_candle_low"],
+        )
 
-        params_common = {"ticker": ticker, "uid": uid, "date": today}
 
-        # ------------------------------
-        # VWAP Levels
-        # ------------------------------
-        try:
-            r = requests.get(VWAP_URL, params=params_common, timeout=60)
-            r.raise_for_status()
-            data = r.json()
-            logging.info(
-                "%s VWAP=%.2f  S=%.2f  R=%.2f",
-                ticker,
-                data.get("vwap", float("nan")),
-                data.get("support", float("nan")),
-                data.get("resistance", float("nan")),
-            )
-            results_rows.append((ticker, "VWAP Levels", data))
-        except Exception as exc:
-            logging.error("VWAP-levels: %s", exc)
+def _log_pattern(ticker: str, label: str, res: dict) -> None:
+    """Log a chart-pattern result: entry/stop (and target, if any) when triggered."""
+    if not res.get("triggered"):
+        logging.info("%s %s not triggered", ticker, label)
+    elif "target_price" in res:
+        logging.info(
+            "%s %s TRIGGERED – entry %.2f stop %.2f target %.2f at %s",
+            ticker,
+            label,
+            res.get("entry_price", float("nan")),
+            res.get("stop_price", float("nan")),
+            res.get("target_price", float("nan")),
+            res.get("trigger_time"),
+        )
+    else:
+        logging.info(
+            "%s %s TRIGGERED – entry %.2f stop %.2f at %s",
+            ticker,
+            label,
+            res.get("entry_price", float("nan")),
+            res.get("stop_price", float("nan")),
+            res.get("trigger_time"),
+        )
 
-        # ------------------------------
-        # Gap-and-Go strategy analysis
-        # ------------------------------
-        try:
-            gag_resp = requests.get(GAP_AND_GO_URL, params=params_common, timeout=60)
-            gag_resp.raise_for_status()
-            gag = gag_resp.json()
-            # Remove redundant fields for report
-            gag.pop("ticker", None)
-            gag.pop("date", None)
-
-            if gag.get("triggered"):
-                logging.info(
-                    "%s Gap&Go TRIGGERED – entry %.2f stop %.2f at %s",
-                    ticker,
-                    gag["entry_price"],
-                    gag["stop_price"],
-                    gag["trigger_time"],
-                )
-            else:
-                logging.info(
-                    "%s Gap&Go not triggered. First candle H/L: %.2f / %.2f",
-                    ticker,
-                    gag["first_candle_high"],
-                    gag["first_candle_low"],
-                )
-            results_rows.append((ticker, "Gap&Go", gag))
-        except Exception as exc:
-            logging.error("Gap-and-Go: %s", exc)
 
-        # ------------------------------
-        # Flat-Top / Flat-Bottom Breakout
-        # ------------------------------
-        try:
-            fb_resp = requests.get(FLAT_BREAKOUT_URL, params=params_common, timeout=60)
-            fb_resp.raise_for_status()
-            fb = fb_resp.json()
-
-            # Iterate over all four patterns in the response
-            for label, res_key in [
-                ("1m Flat-Top", "flat_top_1min"),
-                ("1m Flat-Bottom", "flat_bottom_1min"),
-                ("5m Flat-Top", "flat_top_5min"),
-                ("5m Flat-Bottom", "flat_bottom_5min"),
-            ]:
-                res = fb.get(res_key, {})
-                if not isinstance(res, dict):
-                    continue
-                if res.get("triggered"):
-                    logging.info(
-                        "%s %s TRIGGERED – entry %.2f stop %.2f at %s",
-                        ticker,
-                        label,
-                        res.get("entry_price", float("nan")),
-                        res.get("stop_price", float("nan")),
-                        res.get("trigger_time"),
-                    )
-                else:
-                    logging.info("%s %s not triggered", ticker, label)
-                results_rows.append((ticker, label, res))
-        except Exception as exc:
-            logging.error("Flat-Breakout: %s", exc)
+# Analytical services queried for every gapping ticker:
+# (name for error logs, URL, labels, result logger)
+SERVICES = (
+    ("VWAP-levels", VWAP_URL, VWAP_LABELS, _log_vwap),
+    ("Gap-and-Go", GAP_AND_GO_URL, GAP_AND_GO_LABELS, _log_gap_and_go),
+    ("Flat-Breakout", FLAT_BREAKOUT_URL, FLAT_LABELS, _log_pattern),
+    ("BullFlag", BULL_FLAG_URL, BULL_FLAG_LABELS, _log_pattern),
+    ("FirstPullback", FIRST_PULLBACK_URL, FIRST_PULLBACK_LABELS, _log_pattern),
+    ("ABCD", ABCD_URL, ABCD_LABELS, _log_pattern),
+)
 
-        # ------------------------------
-        # Bull Flag pattern analysis
-        # ------------------------------
-        try:
-            bf_resp = requests.get(BULL_FLAG_URL, params=params_common, timeout=60)
-            bf_resp.raise_for_status()
-            bf = bf_resp.json()
-            # Log results for 1m and 5m timeframes
-            for label, res_key in [("1m BullFlag", "bull_flag_1min"),
-                                   ("5m BullFlag", "bull_flag_5min")]:
-                res = bf.get(res_key, {})
-                if not isinstance(res, dict):
-                    continue
-                if res.get("triggered"):
-                    logging.info(
-                        "%s %s TRIGGERED – entry %.2f stop %.2f target %.2f at %s",
-                        ticker,
-                        label,
-                        res.get("entry_price", float("nan")),
-                        res.get("stop_price", float("nan")),
-                        res.get("target_price", float("nan")),
-                        res.get("trigger_time")
-                    )
-                else:
-                    logging.info("%s %s not triggered", ticker, label)
-                results_rows.append((ticker, label, res))
-        except Exception as exc:
-            logging.error("BullFlag: %s", exc)
 
-        # ------------------------------
-        # First Pullback pattern analysis
-        # ------------------------------
-        try:
-            fp_resp = requests.get(FIRST_PULLBACK_URL, params=params_common, timeout=60)
-            fp_resp.raise_for_status()
-            fp = fp_resp.json()
-
-            # Log results for 1min and 5min timeframes
-            for label, res_key in [("1m FirstPullback", "first_pullback_1min"),
-                                   ("5m FirstPullback", "first_pullback_5min")]:
-                res = fp.get(res_key, {})
-                if not isinstance(res, dict):
-                    continue
-                if res.get("triggered"):
-                    logging.info(
-                        "%s %s TRIGGERED – entry %.2f stop %.2f target %.2f at %s",
-                        ticker,
-                        label,
-                        res.get("entry_price", float("nan")),
-                        res.get("stop_price", float("nan")),
-                        res.get("target_price", float("nan")),
-                        res.get("trigger_time")
-                    )
-                else:
-                    logging.info("%s %s not triggered", ticker, label)
-                results_rows.append((ticker, label, res))
-        except Exception as exc:
-            logging.error("FirstPullback: %s", exc)
+async def _process_ticker(
+    client: httpx.AsyncClient,
+    sem: asyncio.Semaphore,
+    gap: dict,
+    today: str,
+) -> list:
+    """Query every analytical service for one gapping ticker; return its (label, result) pairs."""
+    ticker: str = gap["ticker"]
+    uid: str = gap["uid"]
+    gap_pct: float = gap["gap"] * 100
+    logging.info("Лидер по гэпу: %s  gap=%.2f%%", ticker, gap_pct)
+
+    params_common = {"ticker": ticker, "uid": uid, "date": today}
+    results_rows: list = []
+
+    # the services are independent – request them all at once
+    async with sem:
+        bodies = await asyncio.gather(
+            *(_fetch_json(client, url, params_common) for _name, url, _labels, _log in SERVICES),
+            return_exceptions=True,
+        )
 
-        # ------------------------------
-        # ABCD pattern analysis
-        # ------------------------------
+    for (name, _url, labels, log_result), body in zip(SERVICES, bodies):
+        if isinstance(body, BaseException):
+            logging.error("%s: %s", name, body)
+            continue
         try:
-            abcd_resp = requests.get(ABCD_URL, params=params_common, timeout=60)
-            abcd_resp.raise_for_status()
-            abcd = abcd_resp.json()
-            for label, res_key in [("1m ABCD", "abcd_1min"), ("5m ABCD", "abcd_5min")]:
-                res = abcd.get(res_key, {})
-                if not isinstance(res, dict):
-                    continue
-                if res.get("triggered"):
-                    logging.info(
-                        "%s %s TRIGGERED – entry %.2f stop %.2f target %.2f at %s",
-                        ticker, label,
-                        res.get("entry_price", float("nan")),
-                        res.get("stop_price", float("nan")),
-                        res.get("target_price", float("nan")),
-                        res.get("trigger_time")
-                    )
+            for label, res_key in labels:
+                if res_key is None:
+                    res = body
+                    # Remove redundant fields for report
+                    res.pop("ticker", None)
+                    res.pop("date", None)
                 else:
-                    logging.info("%s %s not triggered", ticker, label)
-                results_rows.append((ticker, label, res))
+                    res = body.get(res_key, {})
+                    if not isinstance(res, dict):
+                        continue
+                log_result(ticker, label, res)
+                results_rows.append((label, res))
         except Exception as exc:
-            logging.error("ABCD: %s", exc)
+            logging.error("%s: %s", name, exc)
+
+    return results_rows
+
+
+def _new_client() -> httpx.AsyncClient:
+    """HTTP client for the gap scanner and all analytical services."""
+    # http2=True multiplexes requests to one host over a single connection when the
+    # upstream negotiates HTTP/2 (TLS + ALPN); plain-HTTP uvicorn stays on HTTP/1.1
+    return httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT, http2=True)
+
+
+async def run_async(client: httpx.AsyncClient | None = None) -> None:
+    """Fetch gap list and run all strategies for each gapping ticker.
+
+    Pass a long-lived ``client`` to reuse its connection pool across runs;
+    without one a client is opened for this run only.
+    """
+
+    # computed once: the same date goes to every service and into the report,
+    # even if the run straddles midnight
+    today: str = date.today().isoformat()  # YYYY-MM-DD
+    params_gap = {"min_gap": 0.10, "date": today}
+
+    # ------------------------------
+    # Gap-scanner
+    # ------------------------------
+    async with contextlib.AsyncExitStack() as stack:
+        if client is None:
+            client = await stack.enter_async_context(_new_client())
+        # The scanner streams NDJSON rows as it finds them: each ticker's strategy
+        # calls start right away instead of after the whole market has been scanned
+        sem = asyncio.Semaphore(MAX_CONCURRENT_TICKERS)
+        cached = _load_cached_gaps(today)
+        if cached is not None:
+            # same-day re-run (restart, debugging): skip the full-market scan
+            logging.info("Gap-scanner: %d бумаг из кэша за %s", len(cached), today)
+            gaps = cached
+            tasks = [asyncio.create_task(_process_ticker(client, sem, gap, today)) for gap in gaps]
+        else:
+            gaps = []
+            tasks: list[asyncio.Task] = []
+            try:
+                async with client.stream(
+                    "GET", SCAN_STREAM_URL, params=params_gap, timeout=SCAN_TIMEOUT
+                ) as resp:
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if not line:
+                            continue
+                        gap = orjson.loads(line)
+                        gaps.append(gap)
+                        tasks.append(asyncio.create_task(_process_ticker(client, sem, gap, today)))
+            except Exception as exc:  # broad except so orchestrator continues even if scanner fails
+                logging.error("Gap-scanner: %s", exc)
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                return
+            _store_cached_gaps(today, gaps)
+
+        if not gaps:
+            logging.info("Нет акций с гэпом выше порога.")
+            return
+
+        # -------------------------------------------------------------------
+        # Wait for all analytical services
+        # -------------------------------------------------------------------
+        per_ticker = await asyncio.gather(*tasks)
+
+    if not any(per_ticker):
+        # every service failed for every ticker – nothing to report
+        logging.info("Нет результатов стратегий – отчёт не обновляется.")
+        return
+
+    # stream order is completion order – report the biggest gaps first, as before
+    by_gap = sorted(zip(gaps, per_ticker), key=lambda pair: pair[0]["gap"], reverse=True)
 
     # ------------------------------
     # Формирование CSV-отчёта
     # ------------------------------
-    reports_dir = Path(__file__).resolve().parent / "reports"
-    reports_dir.mkdir(parents=True, exist_ok=True)
-    file_path = reports_dir / "strategy_results.csv"
+    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    file_path = REPORTS_DIR / "strategy_results.csv"
 
     # ---- Проверяем, нужно ли писать сегодняшние строки ----
-    today = date.today().isoformat()
+    # Файл ведётся от старых записей к новым, поэтому достаточно последней строки
     if file_path.exists():
-        with file_path.open("r", newline="", encoding="utf-8") as f:
-            reader = csv.reader(f)
-            existing_header = next(reader, [])
-            first_data_row = next(reader, [])
-        if first_data_row and first_data_row[0] == today:
+        if _read_last_line(file_path).startswith(today.encode() + b","):
             logging.info("Данные за %s уже есть – файл не изменён.", today)
             return
 
-    # --- группируем результаты {ticker: {...}} ---
-    grouped: dict[str, dict] = {}
-    for tick, strat_name, res in results_rows:
-        gap_data = next((g for g in gaps["results"] if g["ticker"] == tick), {})
-        grp = grouped.setdefault(
-            tick,
-            {
-                "gap": gap_data.get("gap"),
-                "prev_close": gap_data.get("prev_close"),
-                "open": gap_data.get("open"),
-                "strategies": [],
-            },
-        )
-        grp["strategies"].append((strat_name, res))
-
-    csv_rows: list[list] = []
-    header = [
-        "date",
-        "ticker",
-        "gap",
-        "prev_close",
-        "open",
-        "strategy",
-        "status",
-        "entry",
-        "stop",
-        "target",
-        "pl",
-        "time",
-        "vwap",
-        "support",
-        "resistance",
-    ]
-
-    for tick, data in grouped.items():
+    # Результаты уже сгруппированы по тикерам: (данные гэпа, [(стратегия, результат), ...])
+    lines: list[str] = []
+
+    for gap_data, strategies in by_gap:
+        tick = gap_data["ticker"]
         # Ищем блок VWAP Levels (может быть None, если сервис не ответил)
         vwap_block = next(
-            (res for (strat_name, res) in data["strategies"] if strat_name == "VWAP Levels"),
+            (res for (strat_name, res) in strategies if strat_name == "VWAP Levels"),
             {},
         )
         vwap_val = vwap_block.get("vwap", "")
         sup_val = vwap_block.get("support", "")
         res_val = vwap_block.get("resistance", "")
 
-        gap_raw = data.get("gap")
+        gap_raw = gap_data.get("gap")
         gap_pct = f"{gap_raw * 100:.2f}" if isinstance(gap_raw, (int, float)) else ""
-        prev_cls = f"{data['prev_close']:.2f}" if isinstance(data.get("prev_close"), (int, float)) else ""
-        open_val = f"{data['open']:.2f}" if isinstance(data.get("open"), (int, float)) else ""
+        prev_cls = f"{gap_data['prev_close']:.2f}" if isinstance(gap_data.get("prev_close"), (int, float)) else ""
+        open_val = f"{gap_data['open']:.2f}" if isinstance(gap_data.get("open"), (int, float)) else ""
+
+        # Общие для всех стратегий тикера столбцы форматируются один раз
+        head = f"{today},{tick},{gap_pct},{prev_cls},{open_val}"
+        tail = ",".join(
+            f"{v:.2f}" if isinstance(v, (int, float)) else v for v in (vwap_val, sup_val, res_val)
+        )
 
         # Формируем строки по всем стратегиям, исключая сам блок VWAP Levels
-        for strat_name, res in data["strategies"]:
+        for strat_name, res in strategies:
             if strat_name == "VWAP Levels":
                 continue
 
-            status_emoji = "✅" if res.get("triggered") else "❌"
-            entry = f"{res.get('entry_price', ''):.2f}" if res.get("entry_price") else ""
-            stop = f"{res.get('stop_price', ''):.2f}" if res.get("stop_price") else ""
-            target = f"{res.get('target_price', ''):.2f}" if res.get("target_price") else ""
-
-            # P/L (только потенциальная прибыль, как в примере)
-            if res.get("triggered") and res.get("entry_price") and res.get("target_price"):
-                pl_val = f"+{res['target_price'] - res['entry_price']:.2f}"
-            else:
-                pl_val = ""
-
-            # Время (UTC → Moscow) в HH:MM
-            if res.get("trigger_time"):
-                try:
-                    dt_utc = datetime.fromisoformat(res["trigger_time"])
-                    dt_msk = dt_utc.astimezone(ZoneInfo("Europe/Moscow"))
-                    time_val = dt_msk.strftime("%H:%M")
-                except Exception:
-                    time_val = ""
-            else:
-                time_val = ""
-
-            csv_rows.append(
-                [
-                    today,
-                    tick,
-                    gap_pct,
-                    prev_cls,
-                    open_val,
-                    strat_name,
-                    status_emoji,
-                    entry,
-                    stop,
-                    target,
-                    pl_val,
-                    time_val,
-                    f"{vwap_val:.2f}" if isinstance(vwap_val, (int, float)) else vwap_val,
-                    f"{sup_val:.2f}" if isinstance(sup_val, (int, float)) else sup_val,
-                    f"{res_val:.2f}" if isinstance(res_val, (int, float)) else res_val,
-                ]
+            # Каждое поле результата читается из словаря один раз
+            triggered, entry, stop, target, ttime = map(res.get, RESULT_FIELDS)
+            if not triggered:
+                lines.append(ROW_NOT_TRIGGERED.format(head=head, strat=strat_name, tail=tail))
+                continue
+
+            # P/L (только потенциальная прибыль, как в примере) – только при наличии входа и цели
+            has_pl = bool(target) and entry is not None
+            tmpl = ROW_TRIGGERED if has_pl else ROW_TRIGGERED_NO_TARGET
+            lines.append(
+                tmpl.format(
+                    head=head,
+                    strat=strat_name,
+                    entry=f"{entry:.2f}" if entry is not None else "",
+                    stop=f"{stop:.2f}" if stop is not None else "",
+                    target=target,
+                    pl=target - entry if has_pl else None,
+                    time=_msk_hhmm(ttime) if ttime else "",  # UTC → Moscow, HH:MM
+                    tail=tail,
+                )
             )
 
-    # ---- Собираем старые данные ----
-    old_rows = []
-    if file_path.exists():
-        with file_path.open("r", newline="", encoding="utf-8") as f:
-            reader = csv.reader(f)
-            old_header = next(reader, [])
-            old_rows = list(reader)
-
-    # ---- Пишем во временный файл, потом атомарно заменяем ----
-    with tempfile.NamedTemporaryFile("w",
-                                    newline="",
-                                    encoding="utf-8",
-                                    delete=False) as tmp:
-        writer = csv.writer(tmp)
-        writer.writerow(header)           # шапка (можно взять existing_header, если она у вас менялась)
-        writer.writerows(csv_rows)        # свежие строки
-        writer.writerows(old_rows)        # предыдущие записи
-        tmp_name = tmp.name
-
-    shutil.move(tmp_name, file_path)
+    # ---- Дописываем сегодняшние строки в конец файла одним вызовом ----
+    # Поля – числа, тикеры, названия стратегий и эмодзи: кавычки не нужны,
+    # поэтому csv.writer не используется. Окончания строк – CRLF, как у csv.writer.
+    if not file_path.exists() or file_path.stat().st_size == 0:
+        lines.insert(0, CSV_HEADER)
+    blob = (CSV_LINE_END.join(lines) + CSV_LINE_END).encode("utf-8")
+    with file_path.open("ab", buffering=0) as f:
+        f.write(blob)
+        os.fsync(f.fileno())
     logging.info("CSV-отчёт обновлён: %s", file_path)
 
 
@@ -385,16 +458,37 @@ def run() -> None:
 # Scheduler entry-point
 # ---------------------------------------------------------------------------
 
-if __name__ == "__main__":
-    # Immediate first run
-    run()
+def run() -> None:
+    """Blocking one-off run with its own HTTP client."""
+    asyncio.run(run_async())
+
+
+async def _run_logged(client: httpx.AsyncClient) -> None:
+    """One scheduled run; a failure is logged and the daily loop keeps going."""
+    try:
+        await run_async(client)
+    except Exception:
+        logging.exception("Orchestrator run failed")
 
-    # Then schedule daily at 10:00 MSK (UTC+3)
-    sched = BlockingScheduler(timezone=ZoneInfo("Europe/Moscow"))
-    sched.add_job(run, CronTrigger(hour=10, minute=0, timezone="Europe/Moscow"))
 
-    logging.info("Orchestrator started – waiting for 10:00 MSK …")
+async def serve() -> None:
+    """Run now, then daily at 10:00 MSK, keeping one connection pool for the whole process."""
+    async with _new_client() as client:
+        # Immediate first run
+        await _run_logged(client)
+
+        logging.info("Orchestrator started – waiting for 10:00 MSK …")
+        while True:
+            now = datetime.now(MSK)
+            next_run = now.replace(hour=RUN_HOUR, minute=RUN_MINUTE, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+            await _run_logged(client)
+
+
+if __name__ == "__main__":
     try:
-        sched.start()
+        asyncio.run(serve())
     except (KeyboardInterrupt, SystemExit):
         logging.info("Orchestrator stopped.")
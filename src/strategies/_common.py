@@ -0,0 +1,81 @@
+"""Plumbing shared by the strategy services: the pattern strategies served from
+``app.py`` as well as ``flat_breakout.py`` and ``gap_and_go.py``.
+
+Loads the Tinkoff token, configures logging, owns the single Tinkoff client
+(gRPC channel) opened in ``lifespan`` and wraps candle fetching and date
+parsing with the HTTP errors the endpoints return.
+"""
+import os
+import logging
+from datetime import date, datetime, timedelta, timezone
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException
+from tinkoff.invest import AsyncClient, CandleInterval
+from tinkoff.invest.async_services import AsyncServices
+from dotenv import load_dotenv
+
+from candles import Candles, get_candles
+
+# Fetch constants (built once, not per request)
+_MIDNIGHT_UTC = datetime.min.time().replace(tzinfo=timezone.utc)
+_ONE_DAY = timedelta(days=1)
+INTERVAL_1M = CandleInterval.CANDLE_INTERVAL_1_MIN
+INTERVAL_5M = CandleInterval.CANDLE_INTERVAL_5_MIN
+
+# Load API token from .env (in the strategies folder)
+_env_path = Path(__file__).resolve().parent / ".env"
+if _env_path.exists():
+    load_dotenv(dotenv_path=_env_path)
+else:
+    raise RuntimeError(".env file not found. Please create a .env file with TINKOFF_INVEST_TOKEN=<your token>")
+
+TOKEN = os.getenv("TINKOFF_INVEST_TOKEN")
+if not TOKEN:
+    raise RuntimeError("TINKOFF_INVEST_TOKEN is not set in environment")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+
+# Tinkoff Invest API client: opened once in lifespan and shared by all routes
+_client: AsyncServices | None = None
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """Open one Tinkoff client (gRPC channel) for the lifetime of the app."""
+    global _client
+    async with AsyncClient(TOKEN) as client:
+        _client = client
+        try:
+            yield
+        finally:
+            _client = None
+
+def parse_trade_date(date_: str | None) -> date:
+    """Parse a ``YYYY-MM-DD`` query value; defaults to today (UTC)."""
+    try:
+        return datetime.strptime(date_, "%Y-%m-%d").date() if date_ else datetime.utcnow().date()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid date format") from exc
+
+async def fetch_candles(uid: str, start: datetime, end: datetime, interval: CandleInterval) -> Candles:
+    """Fetch historical candles for ``[start, end)`` using Tinkoff Invest API."""
+    try:
+        return await get_candles(_client, uid, start, end, interval)
+    except Exception as exc:
+        logging.exception("Tinkoff Invest API error")
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+async def fetch_day_candles(uid: str, trade_date: date, interval: CandleInterval) -> Candles:
+    """Fetch the full UTC day of candles (midnight to midnight); no candles is an error."""
+    start_ts = datetime.combine(trade_date, _MIDNIGHT_UTC)
+    candles = await fetch_candles(uid, start_ts, start_ts + _ONE_DAY, interval)
+    if not candles:
+        raise HTTPException(
+            status_code=500,
+            detail=f"No candles for {trade_date} with interval {interval.name}"
+        )
+    return candles
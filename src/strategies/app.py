@@ -0,0 +1,45 @@
+import os
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from _common import lifespan
+import abcd
+import bull_flag
+import first_pullback
+
+# One app (one process, one Tinkoff client, one candle cache) for the chart-pattern strategies
+app = FastAPI(
+    title="Pattern Strategies API",
+    description=(
+        "Chart-pattern strategy microservice: Bull Flag, First Pullback and ABCD patterns "
+        "for a given ticker on the specified date, on 1-minute and 5-minute candles "
+        "(as used in momentum trading by Ross Cameron)."
+    ),
+    version="0.1.0",
+    lifespan=lifespan,
+)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+app.include_router(bull_flag.router)
+app.include_router(first_pullback.router)
+app.include_router(abcd.router)
+
+if __name__ == "__main__":
+    import uvicorn
+    # Each worker process opens its own Tinkoff client in lifespan and keeps its
+    # own candle cache, so the default is a small fixed count (os.cpu_count() in
+    # a container reports the host's cores, not the CPU quota)
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=int(os.getenv("PORT", 8004)),
+        workers=int(os.getenv("WEB_CONCURRENCY", 2)),
+        reload=False,
+    )
@@ -0,0 +1,197 @@
+"""Candle fetching shared by the strategy services.
+
+Candles are converted once per fetch into NumPy arrays (``Candles``) that the
+analyzers consume directly. Closed time ranges (ended at least ``CLOSE_GRACE``
+ago, so the broker has finalised the last candle) never change, so their
+arrays are kept in a per-process LRU cache and on disk under ``CACHE_DIR``
+(shared by the services); other ranges are cached in memory for ``LIVE_TTL``
+seconds only. Concurrent requests for
+the same range share one in-flight API call.
+"""
+import os
+import asyncio
+import logging
+import time
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from tinkoff.invest import CandleInterval
+from tinkoff.invest.async_services import AsyncServices
+
+CACHE_SIZE = 1024  # (uid, from, to, interval) entries kept per process
+LIVE_TTL = 60.0    # seconds a range that is not yet closed stays cached
+CLOSE_GRACE = timedelta(minutes=5)  # a range counts as closed this long after its end
+_NANO_SCALE = 1e-9  # Quotation.nano → fraction of a unit
+CACHE_DIR = Path(os.getenv("CANDLE_CACHE_DIR", Path(__file__).resolve().parent / ".cache"))
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_US = timedelta(microseconds=1)
+
+
+@dataclass(frozen=True, slots=True)
+class Candles:
+    """Column arrays of one candle series (read-only: instances are shared through the cache)."""
+    open: np.ndarray    # float64
+    high: np.ndarray    # float64
+    low: np.ndarray     # float64
+    close: np.ndarray   # float64
+    volume: np.ndarray  # int64
+    time: tuple[datetime, ...]
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+
+def _to_candles(raw: list) -> Candles:
+    """Convert HistoricCandle objects into column arrays in one go."""
+    n = len(raw)
+
+    def prices(field: str) -> np.ndarray:
+        quotes = [getattr(c, field) for c in raw]
+        units = np.fromiter((q.units for q in quotes), dtype=np.int64, count=n)
+        nano = np.fromiter((q.nano for q in quotes), dtype=np.int64, count=n)
+        return units + nano * _NANO_SCALE  # one vectorised multiply instead of a division per quote
+
+    return _frozen(
+        prices("open"),
+        prices("high"),
+        prices("low"),
+        prices("close"),
+        np.fromiter((c.volume for c in raw), dtype=np.int64, count=n),
+        time=tuple(c.time for c in raw),
+    )
+
+
+def _frozen(*arrays: np.ndarray, time: tuple[datetime, ...]) -> Candles:
+    for a in arrays:
+        a.flags.writeable = False
+    return Candles(*arrays, time=time)
+
+
+def resample(candles: Candles, minutes: int) -> Candles:
+    """Aggregate candles into ``minutes``-long candles aligned to UTC, as the API does.
+
+    Each output candle starts at its bucket boundary; buckets without any input
+    candle are skipped (the API returns no empty candles either).
+    """
+    if not candles:
+        return candles
+    width = minutes * 60
+    buckets = np.fromiter(
+        (int(t.timestamp()) // width for t in candles.time), dtype=np.int64, count=len(candles)
+    )
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    ends = np.append(starts[1:], len(candles)) - 1
+    return _frozen(
+        candles.open[starts],
+        np.maximum.reduceat(candles.high, starts),
+        np.minimum.reduceat(candles.low, starts),
+        candles.close[ends],
+        np.add.reduceat(candles.volume, starts),
+        time=tuple(_EPOCH + timedelta(seconds=int(b) * width) for b in buckets[starts]),
+    )
+
+
+def trailing_min(a: np.ndarray, w: int) -> np.ndarray:
+    """``out[i] = a[max(0, i-w+1) : i+1].min()`` for every i, in O(n)."""
+    out = np.minimum.accumulate(a)  # exact while the window is still clipped at 0
+    if len(a) >= w:
+        out[w - 1:] = sliding_window_view(a, w).min(axis=1)
+    return out
+
+
+def trailing_max(a: np.ndarray, w: int) -> np.ndarray:
+    """``out[i] = a[max(0, i-w+1) : i+1].max()`` for every i, in O(n)."""
+    out = np.maximum.accumulate(a)
+    if len(a) >= w:
+        out[w - 1:] = sliding_window_view(a, w).max(axis=1)
+    return out
+
+
+def _disk_path(key: tuple) -> Path:
+    uid, start, end, interval = key
+    return CACHE_DIR / f"{uid}_{start:%Y%m%dT%H%M}_{end:%Y%m%dT%H%M}_{interval.name}.npz"
+
+
+def _read_disk(key: tuple) -> Candles | None:
+    """Candles of a closed range saved by any of the services, or None."""
+    try:
+        with np.load(_disk_path(key)) as f:
+            return _frozen(
+                f["open"], f["high"], f["low"], f["close"], f["volume"],
+                time=tuple(_EPOCH + int(us) * _ONE_US for us in f["time_us"]),
+            )
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        return None  # missing or unreadable: fetch from the API
+
+
+def _write_disk(key: tuple, candles: Candles) -> None:
+    path = _disk_path(key)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            tmp,
+            open=candles.open, high=candles.high, low=candles.low,
+            close=candles.close, volume=candles.volume,
+            time_us=np.fromiter(((t - _EPOCH) // _ONE_US for t in candles.time), dtype=np.int64),
+        )
+        os.replace(tmp, path)  # atomic: readers never see a partial file
+    except OSError as exc:
+        logging.warning("Failed to save candle cache %s: %s", path.name, exc)
+
+
+_cache: "OrderedDict[tuple, tuple[float, Candles]]" = OrderedDict()
+_inflight: dict[tuple, asyncio.Task] = {}  # key -> pending API call (all access is on the event loop)
+
+
+async def get_candles(
+    client: AsyncServices,
+    uid: str,
+    start: datetime,
+    end: datetime,
+    interval: CandleInterval,
+) -> Candles:
+    """Return candles for ``[start, end)``, from the cache when possible."""
+    key = (uid, start, end, interval)
+    hit = _cache.get(key)
+    if hit is not None and hit[0] > time.monotonic():
+        _cache.move_to_end(key)
+        return hit[1]
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_load(client, key))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t: _inflight.pop(key, None))
+    # shield: one caller being cancelled must not cancel the fetch the others await
+    return await asyncio.shield(task)
+
+
+async def _load(client: AsyncServices, key: tuple) -> Candles:
+    uid, start, end, interval = key
+    closed = end + CLOSE_GRACE <= datetime.now(timezone.utc)
+    candles = _read_disk(key) if closed else None
+    if candles is None:
+        response = await client.market_data.get_candles(
+            instrument_id=uid,
+            from_=start,
+            to=end,
+            interval=interval,
+        )
+        candles = _to_candles(response.candles)
+        if not candles:
+            return candles  # not cached: an empty answer may be transient
+        if closed:
+            _write_disk(key, candles)
+
+    expires = float("inf") if closed else time.monotonic() + LIVE_TTL
+    _cache[key] = (expires, candles)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return candles
@@ -1,33 +1,16 @@
 import os
 import logging
-from datetime import date, datetime, timedelta, timezone
-from pathlib import Path
+from datetime import date, datetime
 
-from fastapi import FastAPI, HTTPException, Query
+import numpy as np
+from fastapi import FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from tinkoff.invest import Client, CandleInterval, HistoricCandle, Quotation
-from dotenv import load_dotenv
-
-def _quote_to_float(q: "Quotation") -> float:
-    """Convert a Tinkoff Quotation object to float."""
-    return q.units + q.nano / 1e9
-
-# Load environment variables
-_env_path = Path(__file__).resolve().parent / ".env"
-if _env_path.exists():
-    load_dotenv(dotenv_path=_env_path)
-else:
-    raise RuntimeError(".env file not found. Please create a .env file with TINKOFF_INVEST_TOKEN=<your token>")
-
-TOKEN = os.getenv("TINKOFF_INVEST_TOKEN")
-if not TOKEN:
-    raise RuntimeError("TINKOFF_INVEST_TOKEN is not set in environment")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+
+from candles import Candles, resample
+from _common import INTERVAL_1M, fetch_day_candles, lifespan, parse_trade_date
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Flat-Top/Flat-Bottom Breakout API",
@@ -36,6 +19,7 @@ app = FastAPI(
         "for a given ticker on the specified date (1-minute and 5-minute intervals)."
     ),
     version="0.1.0",
+    lifespan=lifespan,  # one Tinkoff client (gRPC channel) for the lifetime of the app
 )
 
 app.add_middleware(
@@ -59,117 +43,85 @@ class FlatBreakoutResponse(BaseModel):
     flat_top_5min: PatternResult
     flat_bottom_5min: PatternResult
 
-def _fetch_candles(uid: str, trade_date: date, interval: CandleInterval) -> list[HistoricCandle]:
-    """Fetch historical candles for the given date and interval."""
-    # Tinkoff API: from midnight UTC of that date to midnight of next day UTC
-    start_ts = datetime.combine(trade_date, datetime.min.time(), tzinfo=timezone.utc)
-    end_ts = start_ts + timedelta(days=1)
-    try:
-        with Client(TOKEN) as client:
-            candles = client.market_data.get_candles(
-                instrument_id=uid,
-                from_=start_ts,
-                to=end_ts,
-                interval=interval,
-            ).candles
-    except Exception as exc:
-        logging.exception("Tinkoff Invest API error")
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
-    if not candles:
-        raise HTTPException(status_code=500, detail=f"No candles for {trade_date} with interval {interval.name}")
-    return candles
-
-def _analyze_flat_top(candles: list[HistoricCandle]) -> PatternResult:
+def _first_level_break(x: np.ndarray) -> tuple[int, int] | None:
+    """Find the first candle that breaks above a level touched at least twice.
+
+    The level is the running maximum of ``x``; a break is a new running maximum.
+    Returns ``(break_index, last_touch_index)`` or None.
+    """
+    run_max = np.maximum.accumulate(x)
+    breaks = np.flatnonzero(x[1:] > run_max[:-1]) + 1
+    if not breaks.size:
+        return None
+    # Every value equal to the level before a break sits on the running maximum,
+    # so the touches of each level are counted with one prefix sum
+    touches = np.cumsum(x == run_max)
+    starts = np.concatenate(([0], breaks[:-1]))  # where each broken level was set
+    counts = touches[breaks - 1] - np.where(starts > 0, touches[starts - 1], 0)
+    flat = np.flatnonzero(counts >= 2)
+    if not flat.size:
+        return None
+    i, start = int(breaks[flat[0]]), int(starts[flat[0]])
+    last_touch_index = start + int(np.flatnonzero(x[start:i] == run_max[i - 1])[-1])
+    return i, last_touch_index
+
+def _analyze_flat_top(candles: Candles) -> PatternResult:
     """Analyze flat-top breakout in the given candle series. Returns PatternResult."""
-    triggered = False
-    entry_price = None
-    stop_price = None
-    trigger_time = None
-
-    highs = [_quote_to_float(c.high) for c in candles]
-    lows = [_quote_to_float(c.low) for c in candles]
-
-    # Iterate through candles to find the first breakout above a repeated resistance level
-    max_so_far = highs[0]  # track max high seen so far
-    seen_highs = {highs[0]: 1}  # counts of each high value seen
-
-    for i in range(1, len(candles)):
-        h = highs[i]
-        seen_highs[h] = seen_highs.get(h, 0) + 1  # update count for this high
-        if h > max_so_far:
-            prev_max = max_so_far
-            max_so_far = h
-            # Check if the previous max level was touched at least twice (flat resistance)
-            if seen_highs.get(prev_max, 0) >= 2:
-                # Breakout above prev_max occurred at candle i
-                triggered = True
-                entry_price = prev_max
-                # Find last index where high == prev_max (the last touch before breakout)
-                last_touch_index = max(j for j, hj in enumerate(highs[:i]) if abs(hj - prev_max) < 1e-9)
-                # Determine stop as nearest low before breakout (after last touch)
-                if last_touch_index < i - 1:
-                    # find minimum low between last_touch_index+1 and i-1
-                    stop_price = min(lows[last_touch_index + 1 : i])
-                else:
-                    # breakout happened immediately on the next candle
-                    stop_price = lows[last_touch_index]
-                trigger_time = candles[i].time  # timestamp of breakout candle
-                logging.info(
-                    f"Flat-Top breakout triggered at {trigger_time.isoformat()} "
-                    f"level={entry_price:.4f}, stop={stop_price:.4f}"
-                )
-                break
+    # Price arrays are built once per fetch and shared by all four analyses
+    highs, lows = candles.high, candles.low
+
+    # First breakout above a resistance level touched at least twice
+    found = _first_level_break(highs)
+    if found is None:
+        return PatternResult(triggered=False)
+    i, last_touch_index = found
+    entry_price = float(highs[last_touch_index])
+    # Determine stop as nearest low before breakout (after last touch)
+    if last_touch_index < i - 1:
+        stop_price = float(lows[last_touch_index + 1 : i].min())
+    else:
+        # breakout happened immediately on the next candle
+        stop_price = float(lows[last_touch_index])
+    trigger_time = candles.time[i]  # timestamp of breakout candle
+    logger.info(
+        "Flat-Top breakout triggered at %s level=%.4f, stop=%.4f",
+        trigger_time.isoformat(), entry_price, stop_price,
+    )
     return PatternResult(
-        triggered=triggered,
+        triggered=True,
         entry_price=entry_price,
         stop_price=stop_price,
         trigger_time=trigger_time,
     )
 
-def _analyze_flat_bottom(candles: list[HistoricCandle]) -> PatternResult:
+def _analyze_flat_bottom(candles: Candles) -> PatternResult:
     """Analyze flat-bottom breakdown in the given candle series. Returns PatternResult."""
-    triggered = False
-    entry_price = None
-    stop_price = None
-    trigger_time = None
-
-    lows = [_quote_to_float(c.low) for c in candles]
-    highs = [_quote_to_float(c.high) for c in candles]
-
-    min_so_far = lows[0]
-    seen_lows = {lows[0]: 1}
-
-    for i in range(1, len(candles)):
-        lo = lows[i]
-        seen_lows[lo] = seen_lows.get(lo, 0) + 1
-        if lo < min_so_far:
-            prev_min = min_so_far
-            min_so_far = lo
-            # Check if the previous min level was touched at least twice (flat support)
-            if seen_lows.get(prev_min, 0) >= 2:
-                # Breakdown below prev_min occurred at candle i
-                triggered = True
-                entry_price = prev_min
-                last_touch_index = max(j for j, lj in enumerate(lows[:i]) if abs(lj - prev_min) < 1e-9)
-                if last_touch_index < i - 1:
-                    stop_price = max(highs[last_touch_index + 1 : i])
-                else:
-                    stop_price = highs[last_touch_index]
-                trigger_time = candles[i].time
-                logging.info(
-                    f"Flat-Bottom breakdown triggered at {trigger_time.isoformat()} "
-                    f"level={entry_price:.4f}, stop={stop_price:.4f}"
-                )
-                break
+    lows, highs = candles.low, candles.high
+
+    # A breakdown below flat support is a breakout above flat resistance of the negated lows
+    found = _first_level_break(-lows)
+    if found is None:
+        return PatternResult(triggered=False)
+    i, last_touch_index = found
+    entry_price = float(lows[last_touch_index])
+    if last_touch_index < i - 1:
+        stop_price = float(highs[last_touch_index + 1 : i].max())
+    else:
+        stop_price = float(highs[last_touch_index])
+    trigger_time = candles.time[i]
+    logger.info(
+        "Flat-Bottom breakdown triggered at %s level=%.4f, stop=%.4f",
+        trigger_time.isoformat(), entry_price, stop_price,
+    )
     return PatternResult(
-        triggered=triggered,
+        triggered=True,
         entry_price=entry_price,
         stop_price=stop_price,
         trigger_time=trigger_time,
     )
 
 @app.get("/flat-breakout", response_model=FlatBreakoutResponse)
-def flat_breakout(
+async def flat_breakout(
     ticker: str = Query(..., description="Ticker symbol, e.g. SBER"),
     uid: str = Query(..., description="Instrument UID in Tinkoff Invest API"),
     date_: str | None = Query(
@@ -179,16 +131,14 @@ def flat_breakout(
     ),
 ):
     """Analyze Flat-Top/Flat-Bottom breakout patterns for the given ticker on the given date."""
-    try:
-        trade_date = datetime.strptime(date_, "%Y-%m-%d").date() if date_ else datetime.utcnow().date()
-    except ValueError as exc:
-        raise HTTPException(status_code=400, detail="Invalid date format") from exc
-
-    # Fetch 1-minute and 5-minute candles for the day
-    candles_1m = _fetch_candles(uid, trade_date, CandleInterval.CANDLE_INTERVAL_1_MIN)
-    candles_5m = _fetch_candles(uid, trade_date, CandleInterval.CANDLE_INTERVAL_5_MIN)
-    logging.info("Fetched %d candles (1min) and %d candles (5min) for %s on %s",
-                 len(candles_1m), len(candles_5m), ticker, trade_date)
+    trade_date = parse_trade_date(date_)
+
+    # Fetch 1-minute candles for the day; the 5-minute series is aggregated from them
+    # locally instead of a second API round-trip
+    candles_1m = await fetch_day_candles(uid, trade_date, INTERVAL_1M)
+    candles_5m = resample(candles_1m, 5)
+    logger.info("Fetched %d candles (1min), built %d candles (5min) for %s on %s",
+                len(candles_1m), len(candles_5m), ticker, trade_date)
 
     result_top_1m = _analyze_flat_top(candles_1m)
     result_bottom_1m = _analyze_flat_bottom(candles_1m)
@@ -1,11 +1,13 @@
 from __future__ import annotations
 import os
 import datetime as _dt
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import List, Dict
 
-import pandas as pd
-from tinkoff.invest import Client, CandleInterval
+import numpy as np
+from tinkoff.invest import AsyncClient, CandleInterval
+from tinkoff.invest.async_services import AsyncServices
 from tinkoff.invest.utils import now
 from fastapi import FastAPI, HTTPException
 import uvicorn
@@ -21,6 +23,10 @@ if _env_path.exists():
 else:
     raise RuntimeError(".env file not found. Please create a .env file with TINKOFF_INVEST_TOKEN=<your token>")
 
+TOKEN = os.getenv("TINKOFF_INVEST_TOKEN")
+if not TOKEN:
+    raise RuntimeError("TINKOFF_INVEST_TOKEN не найден в окружении")
+
 
 # ──────────────────────────────────────────────────────────────
 # DB helpers
@@ -34,63 +40,61 @@ def _to_ts(date_: _dt.date) -> _dt.datetime:
     """UTC‐полночь для указанной даты."""
     return _dt.datetime.combine(date_, _dt.time.min, tzinfo=_dt.timezone.utc)
 
-def _load_minute_candles(uid: str, date_: _dt.date, client: Client) -> pd.DataFrame:
-    """Минутные свечи за день для одного инструмента."""
+async def _load_minute_candles(
+    uid: str, date_: _dt.date, client: AsyncServices
+) -> tuple[np.ndarray, np.ndarray]:
+    """Минутные свечи за день для одного инструмента: массивы (close, volume)."""
     from_ts = _to_ts(date_)
     to_ts = from_ts + _dt.timedelta(days=1)
 
-    candles = client.market_data.get_candles(
-        instrument_id=uid,
-        from_=from_ts,
-        to=to_ts,
-        interval=CandleInterval.CANDLE_INTERVAL_1_MIN,
+    candles = (
+        await client.market_data.get_candles(
+            instrument_id=uid,
+            from_=from_ts,
+            to=to_ts,
+            interval=CandleInterval.CANDLE_INTERVAL_1_MIN,
+        )
     ).candles
     if not candles:
         raise ValueError(f"Нет минутных свечей за {date_}")
 
-    df = pd.DataFrame(
-        {
-            "ts": [c.time for c in candles],
-            "close": [
-                c.close.units + c.close.nano / 1e9 for c in candles
-            ],
-            "volume": [c.volume for c in candles],
-        }
+    n = len(candles)
+    close = np.fromiter(
+        (c.close.units + c.close.nano * 1e-9 for c in candles), dtype=np.float64, count=n
     )
-    return df
+    volume = np.fromiter((c.volume for c in candles), dtype=np.int64, count=n)
+    return close, volume
 
-def _compute_vwap(df: pd.DataFrame) -> pd.Series:
-    pv = (df["close"] * df["volume"]).cumsum()
-    vol = df["volume"].cumsum()
-    return pv / vol  # Series той же длины
+def _compute_vwap(close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    pv = np.cumsum(close * volume)
+    vol = np.cumsum(volume)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pv / vol  # массив той же длины; NaN, пока суммарный объём нулевой
 
 # ──────────────────────────────────────────────────────────────
 # Core
 # ──────────────────────────────────────────────────────────────
-def calc_vwap_levels(
+async def calc_vwap_levels(
     ticker: str,
     uid: str,
+    client: AsyncServices,
     date_: _dt.date | None = None,
 ) -> Dict[str, float]:
     """
-    Возвращает словарь {'vwap', 'support', 'resistance', 'std'} для тикера
-    и сразу пишет строку в БД.
+    Возвращает словарь {'vwap', 'support', 'resistance', 'std'} для тикера.
+    Только расчёт: в БД ничего не пишется, результат сохраняет оркестратор в отчёт.
+
+    *client* — уже открытый клиент Tinkoff (см. ``_lifespan``).
     """
     if date_ is None:
         date_ = now().date()
 
-    token = os.getenv("TINKOFF_INVEST_TOKEN")
-    if not token:
-        raise RuntimeError("TINKOFF_INVEST_TOKEN не найден в окружении")
+    close, volume = await _load_minute_candles(uid, date_, client)
 
-    with Client(token) as client:
-        df = _load_minute_candles(uid, date_, client)
+    vwap = _compute_vwap(close, volume)
+    std = float(np.nanstd(close - vwap, ddof=1))  # выборочное std без NaN, как у pandas
 
-    df["vwap"] = _compute_vwap(df)
-    diff = df["close"] - df["vwap"]
-    std = diff.std()
-
-    vwap_today = df["vwap"].iloc[-1]
+    vwap_today = float(vwap[-1])
     support = vwap_today - std
     resistance = vwap_today + std
 
@@ -101,10 +105,24 @@ def calc_vwap_levels(
         "std": std,
     }
 
-app = FastAPI(title="VWAP Levels API")
+# Клиент Tinkoff Invest API: открывается один раз в _lifespan и используется всеми запросами
+_client: AsyncServices | None = None
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    """Открыть один клиент Tinkoff (gRPC-канал) на всё время жизни приложения."""
+    global _client
+    async with AsyncClient(TOKEN) as client:
+        _client = client
+        try:
+            yield
+        finally:
+            _client = None
+
+app = FastAPI(title="VWAP Levels API", lifespan=_lifespan)
 
 @app.get("/vwap-levels")
-def vwap_levels_endpoint(
+async def vwap_levels_endpoint(
     ticker: str,
     uid: str,
     date: str | None = None,
@@ -128,7 +146,7 @@ def vwap_levels_endpoint(
         ) from exc
 
     try:
-        return calc_vwap_levels(ticker, uid, date_parsed)
+        return await calc_vwap_levels(ticker, uid, _client, date_parsed)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 